@@ -11,21 +11,30 @@ Functions:
     start(update, context)
     new_quiz(update, context)
     send_quiz(context)
+    fetch_question(context)
+    prefetch_question(context)
     get_schedule(update, context)
     remove_quiz(update, context)
+    get_usernames(context, user_ids)
     show_leaderboard(update, context)
     receive_quiz_answer(update, context)
+    send_answer_batch(client, batch)
+    flush_answer_queue(application)
+    post_init(application)
+    post_shutdown(application)
     main()
 """
 
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
 import logging
 import os
-import pytz
-import requests
+from zoneinfo import ZoneInfo
+import httpx
 from telegram import Poll
 from telegram import Update
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
@@ -33,7 +42,7 @@ from telegram.ext import (
     PollAnswerHandler,
 )
 from decorators import restricted
-from utils import escape_markdownv2, format_quiz_remarks
+from utils import escape_markdownv2, format_quiz_remarks, parse_time
 
 DAILY_LEADERBOARD_TIME = os.environ["DAILY_LEADERBOARD_TIME"]
 FLASK_API_URL = os.environ["FLASK_API_URL"]
@@ -41,6 +50,17 @@ LOCAL_TIMEZONE = os.environ["LOCAL_TIMEZONE"]
 RULES_PAGE_URL = os.environ["RULES_PAGE_URL"]
 TELEGRAM_BOT_API_TOKEN = os.environ["TELEGRAM_BOT_API_TOKEN"]
 
+# Maximum number of quiz answers that are sent to the Flask API in one request
+ANSWER_BATCH_SIZE = 100
+# Maximum number of seconds that a quiz answer waits before it is sent
+ANSWER_FLUSH_INTERVAL = 0.5
+# Maximum number of quiz answers that can wait in the answer queue
+ANSWER_QUEUE_MAX_SIZE = 10_000
+# Maximum number of times that sending a batch of quiz answers is attempted
+ANSWER_BATCH_MAX_ATTEMPTS = 5
+# Number of seconds to wait before retrying a batch, doubled after every retry
+ANSWER_BATCH_RETRY_DELAY = 1
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
@@ -69,19 +89,21 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         None
     """
 
+    message_thread_id = update.message.message_thread_id
+
     context.job_queue.run_daily(
         send_leaderboard,
-        datetime.strptime(DAILY_LEADERBOARD_TIME, "%H:%M"),
+        parse_time(DAILY_LEADERBOARD_TIME),
         chat_id=update.message.chat_id,
         data={
-            "message_thread_id": update.message.message_thread_id,
+            "message_thread_id": message_thread_id,
         },
     )
 
     await update.message.reply_text(
         "DiscQuiz is running.\n"
         f"The leaderboard will be updated at {DAILY_LEADERBOARD_TIME} daily.",
-        message_thread_id=update.message.message_thread_id,
+        message_thread_id=message_thread_id,
     )
 
 
@@ -104,49 +126,46 @@ async def new_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         None
     """
 
+    message_thread_id = update.message.message_thread_id
+
     if len(context.args) < 1:
         await update.message.reply_text(
             "Please specify a time for the quiz to be sent.",
-            message_thread_id=update.message.message_thread_id,
+            message_thread_id=message_thread_id,
         )
     else:
-        if "active_quiz_message_id" not in context.bot_data:
-            context.bot_data.update({"active_quiz_message_id": None})
+        context.bot_data.setdefault("active_quiz_message_id", None)
         try:
-            new_quiz_time = datetime.strptime(context.args[0], "%H:%M")
+            new_quiz_time = parse_time(context.args[0])
         except ValueError:
             await update.message.reply_text(
                 "Invalid time format. Please specify the time in the HH:MM format.",
-                message_thread_id=update.message.message_thread_id,
+                message_thread_id=message_thread_id,
             )
         else:
-            quiz_time_is_invalid = False
-            scheduled_jobs = context.job_queue.jobs()
-            for job in scheduled_jobs:
-                if job.data.get("time_to_send") == new_quiz_time:
-                    quiz_time_is_invalid = True
-                    break
-
-            if quiz_time_is_invalid:
+            # Maps the time of each scheduled daily quiz to its 'send_quiz' job
+            schedule_index = context.bot_data.setdefault("schedule_index", {})
+
+            if new_quiz_time in schedule_index:
                 await update.message.reply_text(
                     "There is already a daily quiz scheduled for "
                     f"{new_quiz_time.strftime('%H:%M')}.",
-                    message_thread_id=update.message.message_thread_id,
+                    message_thread_id=message_thread_id,
                 )
             else:
-                context.job_queue.run_daily(
+                schedule_index[new_quiz_time] = context.job_queue.run_daily(
                     send_quiz,
                     new_quiz_time,
                     chat_id=update.message.chat_id,
                     data={
-                        "message_thread_id": update.message.message_thread_id,
+                        "message_thread_id": message_thread_id,
                         "time_to_send": new_quiz_time,
                     },
                 )
                 await update.message.reply_text(
                     "You have scheduled a quiz to be sent at "
                     f"{new_quiz_time.strftime('%H:%M')} daily.",
-                    message_thread_id=update.message.message_thread_id,
+                    message_thread_id=message_thread_id,
                 )
 
 
@@ -154,6 +173,9 @@ async def send_quiz(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Stops the current quiz, if it exists, and sends a new quiz to the chat.
 
+    The question of the new quiz is the one prefetched by prefetch_question, if
+    there is one.
+
     This function runs when a 'send_quiz' job in the job queue runs.
 
     Args:
@@ -173,36 +195,75 @@ async def send_quiz(context: ContextTypes.DEFAULT_TYPE) -> None:
             message_id=context.bot_data["active_quiz_message_id"],
         )
 
-    response = requests.get(f"{FLASK_API_URL}/get-question", timeout=3)
+    question = context.bot_data.pop("next_question", None)
+    if question is None:
+        # No question was prefetched, so the question is fetched now instead
+        question = await fetch_question(context)
+        if question is None:
+            return
+
+    context.bot_data["active_quiz_question_id"] = question["id"]
+
+    newly_created_quiz = await context.bot.send_poll(
+        chat_id=context.job.chat_id,
+        message_thread_id=context.job.data["message_thread_id"],
+        type=Poll.QUIZ,
+        is_anonymous=False,
+        question=question["text"],
+        options=["True", "False"],
+        correct_option_id=0 if question["answer"] == "TRUE" else 1,
+        explanation=format_quiz_remarks(question["remarks"], RULES_PAGE_URL),
+        explanation_parse_mode="MarkdownV2",
+    )
 
-    match response.status_code:
-        case 200:
-            response_data = response.json()
+    context.bot_data["active_quiz_message_id"] = newly_created_quiz.message_id
 
-            question_id = response_data["id"]
-            question_text = response_data["text"]
-            answer = response_data["answer"]
-            remarks = response_data["remarks"]
+    # Fetch the question for the next quiz in the background, so that it does
+    # not have to be fetched when the next quiz is sent
+    context.application.create_task(prefetch_question(context))
 
-            context.bot_data.update({"active_quiz_question_id": question_id})
 
-            newly_created_quiz = await context.bot.send_poll(
-                chat_id=context.job.chat_id,
-                message_thread_id=context.job.data["message_thread_id"],
-                type=Poll.QUIZ,
-                is_anonymous=False,
-                question=question_text,
-                options=["True", "False"],
-                correct_option_id=0 if answer == "TRUE" else 1,
-                explanation=format_quiz_remarks(remarks, RULES_PAGE_URL),
-                explanation_parse_mode="MarkdownV2",
-            )
+async def fetch_question(context: ContextTypes.DEFAULT_TYPE) -> dict | None:
+    """
+    Fetches a randomly selected question by making a GET request to
+    "/get-question".
 
-            context.bot_data.update(
-                {"active_quiz_message_id": newly_created_quiz.message_id}
-            )
+    Args:
+        context: A python-telegram-bot Context object that represents the
+                    context for the incoming update.
+
+    Returns:
+        A dictionary containing the 'id', 'text', 'answer' and 'remarks' of the
+        question, or None if the question could not be fetched.
+    """
+
+    client = context.bot_data["http_client"]
+    response = await client.get("/get-question")
+
+    match response.status_code:
+        case 200:
+            return response.json()
         case _:
             logging.error(response.text)
+            return None
+
+
+async def prefetch_question(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Fetches the question for the next quiz and stores it in bot_data, where it
+    will be used by the next call to send_quiz.
+
+    Args:
+        context: A python-telegram-bot Context object that represents the
+                    context for the incoming update.
+
+    Returns:
+        None
+    """
+
+    question = await fetch_question(context)
+    if question is not None:
+        context.bot_data["next_question"] = question
 
 
 @restricted
@@ -223,28 +284,23 @@ async def get_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         None
     """
 
-    schedule = []
-    scheduled_jobs = context.job_queue.jobs()
-    for job in scheduled_jobs:
-        time_to_send = job.data.get("time_to_send")
-        if time_to_send:
-            schedule.append(time_to_send)
+    message_thread_id = update.message.message_thread_id
 
-    schedule.sort()
+    schedule = sorted(context.bot_data.get("schedule_index", {}))
 
     if len(schedule) == 0:
         await update.message.reply_text(
             "There are no scheduled quizzes.",
-            message_thread_id=update.message.message_thread_id,
+            message_thread_id=message_thread_id,
         )
     else:
-        bot_reply_message = "__Daily Schedule__\n"
-        for quiz_time in schedule:
-            bot_reply_message += f"•{quiz_time.strftime('%H:%M')}\n"
+        bot_reply_message = "__Daily Schedule__\n" + "".join(
+            f"•{quiz_time.strftime('%H:%M')}\n" for quiz_time in schedule
+        )
 
         await update.message.reply_text(
             bot_reply_message,
-            message_thread_id=update.message.message_thread_id,
+            message_thread_id=message_thread_id,
             parse_mode="MarkdownV2",
         )
 
@@ -269,42 +325,69 @@ async def remove_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         None
     """
 
+    message_thread_id = update.message.message_thread_id
+
     if len(context.args) == 0:
         await update.message.reply_text(
             "Please specify the time of the quiz to be removed.",
-            message_thread_id=update.message.message_thread_id,
+            message_thread_id=message_thread_id,
         )
     else:
         try:
-            quiz_time_to_remove = datetime.strptime(context.args[0], "%H:%M")
+            quiz_time_to_remove = parse_time(context.args[0])
         except ValueError:
             await update.message.reply_text(
                 "Invalid time format. Please specify the time in the HH:MM format.",
-                message_thread_id=update.message.message_thread_id,
+                message_thread_id=message_thread_id,
             )
         else:
-            scheduled_jobs = context.job_queue.jobs()
-            quiz_was_removed = False
-            for job in scheduled_jobs:
-                if job.data.get("time_to_send") == quiz_time_to_remove:
-                    job.schedule_removal()
-                    quiz_was_removed = True
-                    break
-
-            if quiz_was_removed:
+            schedule_index = context.bot_data.setdefault("schedule_index", {})
+            job = schedule_index.pop(quiz_time_to_remove, None)
+
+            if job is not None:
+                job.schedule_removal()
                 await update.message.reply_text(
                     "The daily quiz scheduled for "
                     f"{quiz_time_to_remove.strftime('%H:%M')} has been removed.",
-                    message_thread_id=update.message.message_thread_id,
+                    message_thread_id=message_thread_id,
                 )
             else:
                 await update.message.reply_text(
                     "There is no daily quiz scheduled for "
                     f"{quiz_time_to_remove.strftime('%H:%M')}.",
-                    message_thread_id=update.message.message_thread_id,
+                    message_thread_id=message_thread_id,
                 )
 
 
+async def get_usernames(context: ContextTypes.DEFAULT_TYPE, user_ids: list) -> dict:
+    """
+    Returns the Telegram usernames of the specified users.
+
+    Usernames rarely change, so they are cached in bot_data across calls, and
+    only the users that are not yet cached are looked up (concurrently).
+
+    Args:
+        context: A python-telegram-bot Context object that represents the
+                    context for the incoming update.
+        user_ids: A list of the Telegram user IDs of the users.
+
+    Returns:
+        A dictionary mapping each user ID to the username of that user.
+    """
+
+    username_cache = context.bot_data.setdefault("username_cache", {})
+    missing_user_ids = [
+        user_id for user_id in user_ids if user_id not in username_cache
+    ]
+    user_objs = await asyncio.gather(
+        *(context.bot.get_chat(user_id) for user_id in missing_user_ids)
+    )
+    for user_id, user_obj in zip(missing_user_ids, user_objs):
+        username_cache[user_id] = user_obj.username
+
+    return {user_id: username_cache[user_id] for user_id in user_ids}
+
+
 async def send_leaderboard(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Sends a message containing the current leaderboard.
@@ -319,16 +402,21 @@ async def send_leaderboard(context: ContextTypes.DEFAULT_TYPE) -> None:
         None
     """
 
-    response = requests.get(f"{FLASK_API_URL}/get-user-stats", timeout=3)
+    client = context.bot_data["http_client"]
+    response = await client.get("/get-user-stats")
 
     match response.status_code:
         case 200:
             response_data = response.json()
             bot_reply_message = "__Leaderboard__\n"
             leaderboard_position = 1
+
+            usernames = await get_usernames(
+                context, [user["user_id"] for user in response_data]
+            )
+
             for user in response_data:
-                user_obj = await context.bot.get_chat(user["user_id"])
-                username = user_obj.username
+                username = usernames[user["user_id"]]
 
                 no_of_correctly_answered = user["correctly_answered"]
                 total_answered = user["total_answered"]
@@ -354,8 +442,8 @@ async def receive_quiz_answer(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     """
-    Adds a user's quiz answer to the database by making a POST request to
-    "/insert-into-answer-log".
+    Adds a user's quiz answer to the answer queue, from which it will be added
+    to the database by flush_answer_queue.
 
     This function is run when a user answers a quiz sent by the bot.
 
@@ -374,21 +462,187 @@ async def receive_quiz_answer(
     user_answer = "TRUE" if answer_obj.option_ids[0] == 0 else "FALSE"
     question_id = context.bot_data["active_quiz_question_id"]
 
-    response = requests.post(
-        f"{FLASK_API_URL}/insert-into-answer-log",
-        data={
+    await context.bot_data["answer_queue"].put(
+        {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "user_id": user_id,
             "user_answer": user_answer,
             "question_id": question_id,
-        },
+        }
+    )
+
+
+async def send_answer_batch(client: httpx.AsyncClient, batch: list) -> None:
+    """
+    Adds a batch of quiz answers to the database by making a POST request to
+    "/insert-into-answer-log/batch".
+
+    The answers are not added idempotently, so the request is only retried
+    when it provably did not add them: when the connection to the Flask API
+    could not be made, or when the Flask API returns a 503 because the
+    database was busy. It is then retried with exponential backoff, up to
+    ANSWER_BATCH_MAX_ATTEMPTS attempts in total. Other failed requests are
+    logged and not retried, as the answers may have been added already.
+    Answers rejected by the Flask API as invalid are logged and not retried.
+
+    Args:
+        client: The HTTP client used to make requests to the Flask API.
+        batch: A list of dictionaries, with each dictionary representing a
+                   quiz answer.
+
+    Returns:
+        None
+    """
+
+    retry_delay = ANSWER_BATCH_RETRY_DELAY
+
+    for attempt in range(1, ANSWER_BATCH_MAX_ATTEMPTS + 1):
+        try:
+            response = await client.post("/insert-into-answer-log/batch", json=batch)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # The request was never sent to the Flask API
+            error = repr(e)
+        except httpx.HTTPError as e:
+            # The Flask API may have added the answers before the request
+            # failed (e.g. on a read timeout), so retrying could add them twice
+            logging.error("Error sending %d quiz answers: %r", len(batch), e)
+            return
+        else:
+            match response.status_code:
+                case 201:
+                    return
+                case 207:
+                    # The valid answers have been added, and the rejected
+                    # answers would be rejected again if retried
+                    logging.warning(
+                        "Some quiz answers were rejected: %s", response.text
+                    )
+                    return
+                case 503:
+                    error = response.text
+                case _:
+                    logging.error(response.text)
+                    return
+
+        logging.warning(
+            "Attempt %d of %d to send %d quiz answers failed: %s",
+            attempt,
+            ANSWER_BATCH_MAX_ATTEMPTS,
+            len(batch),
+            error,
+        )
+        if attempt < ANSWER_BATCH_MAX_ATTEMPTS:
+            await asyncio.sleep(retry_delay)
+            retry_delay *= 2
+
+    logging.error(
+        "Dropped %d quiz answers after %d failed attempts",
+        len(batch),
+        ANSWER_BATCH_MAX_ATTEMPTS,
+    )
+
+
+async def flush_answer_queue(application: Application) -> None:
+    """
+    Adds the quiz answers in the answer queue to the database in batches using
+    send_answer_batch.
+
+    A batch is sent once it contains ANSWER_BATCH_SIZE answers, or
+    ANSWER_FLUSH_INTERVAL seconds after its first answer was received,
+    whichever comes first.
+
+    This function runs as a background task from post_init until a None is put
+    into the answer queue by post_shutdown.
+
+    Args:
+        application: The python-telegram-bot Application object of the bot.
+
+    Returns:
+        None
+    """
+
+    loop = asyncio.get_running_loop()
+    answer_queue = application.bot_data["answer_queue"]
+    client = application.bot_data["http_client"]
+
+    is_running = True
+    while is_running:
+        answer = await answer_queue.get()
+        if answer is None:
+            break
+
+        batch = [answer]
+        flush_time = loop.time() + ANSWER_FLUSH_INTERVAL
+        while len(batch) < ANSWER_BATCH_SIZE:
+            try:
+                answer = await asyncio.wait_for(
+                    answer_queue.get(), timeout=flush_time - loop.time()
+                )
+            except asyncio.TimeoutError:
+                break
+
+            if answer is None:
+                is_running = False
+                break
+
+            batch.append(answer)
+
+        await send_answer_batch(client, batch)
+
+
+async def post_init(application: Application) -> None:
+    """
+    Creates the HTTP client used to make requests to the Flask API and the
+    answer queue, stores them in bot_data, and starts the background task that
+    flushes the answer queue.
+
+    This function runs once after the bot has been initialised, before it starts
+    polling for updates.
+
+    Args:
+        application: The python-telegram-bot Application object that is being
+                         initialised.
+
+    Returns:
+        None
+    """
+
+    # Connections to the Flask API are kept alive and reused across requests,
+    # so most requests do not have to open a new connection
+    application.bot_data["http_client"] = httpx.AsyncClient(
+        base_url=FLASK_API_URL,
         timeout=3,
+        limits=httpx.Limits(
+            max_connections=20, max_keepalive_connections=20, keepalive_expiry=30
+        ),
+    )
+    application.bot_data["answer_queue"] = asyncio.Queue(maxsize=ANSWER_QUEUE_MAX_SIZE)
+    application.bot_data["answer_flush_task"] = asyncio.create_task(
+        flush_answer_queue(application)
     )
 
-    match response.status_code:
-        case 201:
-            pass
-        case _:
-            logging.error(response.text)
+
+async def post_shutdown(application: Application) -> None:
+    """
+    Flushes the remaining quiz answers in the answer queue and closes the HTTP
+    client used to make requests to the Flask API.
+
+    This function runs once after the bot has been shut down.
+
+    Args:
+        application: The python-telegram-bot Application object that is being
+                         shut down.
+
+    Returns:
+        None
+    """
+
+    # A None in the answer queue tells flush_answer_queue to send the answers
+    # received so far and stop
+    await application.bot_data["answer_queue"].put(None)
+    await application.bot_data["answer_flush_task"]
+
+    await application.bot_data["http_client"].aclose()
 
 
 def main() -> None:
@@ -403,18 +657,24 @@ def main() -> None:
     """
 
     # Instantiate a Defaults object
-    defaults = Defaults(tzinfo=pytz.timezone(LOCAL_TIMEZONE), quote=False)
+    defaults = Defaults(tzinfo=ZoneInfo(LOCAL_TIMEZONE), quote=False)
 
     # Create the Application and pass it to the bot's token
     application = (
-        ApplicationBuilder().token(TELEGRAM_BOT_API_TOKEN).defaults(defaults).build()
+        ApplicationBuilder()
+        .token(TELEGRAM_BOT_API_TOKEN)
+        .defaults(defaults)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(True)
+        .build()
     )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("new", new_quiz))
     application.add_handler(CommandHandler("remove", remove_quiz))
     application.add_handler(CommandHandler("schedule", get_schedule))
-    application.add_handler(PollAnswerHandler(receive_quiz_answer))
+    application.add_handler(PollAnswerHandler(receive_quiz_answer, block=False))
 
     # Run the bot until the user presses Ctrl-C
     application.run_polling()
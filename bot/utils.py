@@ -11,10 +11,27 @@ Functions are added to this module (as opposed to being written in bot.py) when:
 Functions:
     escape_markdownv2(input_string)
     format_quiz_remarks(text, rules_page_url)
+    parse_time(time_string)
 """
 
+from datetime import datetime
 import re
 
+# Translation table that prepends "\" to all special characters (as per the
+# Telegram MarkdownV2 specification)
+_MARKDOWNV2_ESCAPE_TABLE = str.maketrans(
+    {char: "\\" + char for char in "_*[]()~`>#+-=|{}.!"}
+)
+
+# RegExp pattern to match a word that is a valid rule number, optionally
+# followed by a punctuation mark
+# A valid rule number is a string with integers separated by single periods
+# E.g 1.2, 1.2.3, 1.2.3.4
+_RULE_NUMBER_RE = re.compile(r"(\d+(?:\.\d+)+)([.,;:]?)")
+
+# RegExp pattern to match a time in the HH:MM format
+_TIME_RE = re.compile(r"([01]?\d|2[0-3]):([0-5]?\d)")
+
 
 def escape_markdownv2(input_string):
     # pylint: disable=anomalous-backslash-in-string
@@ -35,35 +52,7 @@ def escape_markdownv2(input_string):
         "1\. zackjh \- 80% \(16/20\)"
     """
 
-    special_chars = [
-        "_",
-        "*",
-        "[",
-        "]",
-        "(",
-        ")",
-        "~",
-        "`",
-        ">",
-        "#",
-        "+",
-        "-",
-        "=",
-        "|",
-        "{",
-        "}",
-        ".",
-        "!",
-    ]
-
-    escaped_string = ""
-    for char in input_string:
-        if char in special_chars:
-            escaped_string += "\\" + char
-        else:
-            escaped_string += char
-
-    return escaped_string
+    return input_string.translate(_MARKDOWNV2_ESCAPE_TABLE)
 
 
 def format_quiz_remarks(quiz_remarks_text, rules_page_url):
@@ -94,28 +83,52 @@ def format_quiz_remarks(quiz_remarks_text, rules_page_url):
             and [1\.11](https://zackjh\.github\.io/discquiz/\#1\.11)"
     """
 
-    # RegExp pattern to match valid rule numbers
-    # A valid rule number is a string with integers separated by single periods
-    # E.g 1.2, 1.2.3, 1.2.3.4
-    rule_pattern = r"\d+(\.\d+)+"
+    # The rules page URL is the same for every hyperlink, so it is only escaped
+    # once
+    url_prefix = escape_markdownv2(f"{rules_page_url}#")
 
     words = quiz_remarks_text.split()
     for i, word in enumerate(words):
+        rule_match = _RULE_NUMBER_RE.fullmatch(word)
         if word.lower() == "definition":
-            url = escape_markdownv2(f"{rules_page_url}#Definitions")
+            url = f"{url_prefix}Definitions"
             words[i] = f"[{word}]({url})"
-        elif re.match(rule_pattern, word):
-            if word[-1] == ".":
-                word = word[0:-1]
-                word_escaped = escape_markdownv2(word)
-                url = escape_markdownv2(f"{rules_page_url}#{word}")
-                words[i] = f"[{word_escaped}]({url})\."
-            else:
-                word_escaped = escape_markdownv2(word)
-                url = escape_markdownv2(f"{rules_page_url}#{word}")
-                words[i] = f"[{word_escaped}]({url})"
+        elif rule_match:
+            rule_number, punctuation = rule_match.groups()
+            rule_number_escaped = escape_markdownv2(rule_number)
+            url = url_prefix + rule_number_escaped
+            punctuation_escaped = escape_markdownv2(punctuation)
+            words[i] = f"[{rule_number_escaped}]({url}){punctuation_escaped}"
         else:
             words[i] = escape_markdownv2(word)
-            continue
 
     return " ".join(words)
+
+
+def parse_time(time_string):
+    """
+    Parses a time in the HH:MM format.
+
+    This is equivalent to datetime.strptime(time_string, "%H:%M"), but avoids
+    the overhead of strptime.
+
+    Args:
+        time_string: The string that will be parsed.
+
+    Returns:
+        A datetime object on 1 January 1900 with the hour and minute of the
+        specified time.
+
+    Raises:
+        ValueError: If time_string is not a valid time in the HH:MM format.
+
+    Usage Example:
+        >>> print(parse_time("10:35"))
+        1900-01-01 10:35:00
+    """
+
+    time_match = _TIME_RE.fullmatch(time_string)
+    if time_match is None:
+        raise ValueError(f"Invalid time format: {time_string!r}")
+
+    return datetime(1900, 1, 1, int(time_match[1]), int(time_match[2]))
@@ -5,17 +5,26 @@ interact with the database.
 Routes:
     /get-question [GET]
     /insert-into-answer-log [POST]
+    /insert-into-answer-log/batch [POST]
     /get-user-stats [GET]
 """
 
 import datetime
 import logging
-import random
+import sqlite3
+import threading
+import time
 from flask import Flask, request
 import db
 
+# Number of seconds for which the response of /get-user-stats is cached
+USER_STATS_CACHE_TTL = 10
+
 app = Flask(__name__)
 
+_user_stats_cache = {"value": None, "expires_at": 0.0}
+_user_stats_cache_lock = threading.Lock()
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
@@ -27,8 +36,8 @@ db.create_tables()
 @app.route("/get-question", methods=["GET"])
 def get_new_question():
     """
-    Randomly selects a question ID, queries the database for the question with
-    the selected question ID, and returns the question.
+    Queries the database for a randomly selected question and returns the
+    question.
 
     This function is called when a GET request to /get-question is made.
 
@@ -42,23 +51,12 @@ def get_new_question():
             - The HTTP response status code 200.
     """
 
-    no_of_questions = len(db.get_questions())
+    question = db.get_random_question()
 
-    if no_of_questions == 0:
+    if question is None:
         return ("There are no questions in the database", 400)
 
-    question_id = random.randint(1, no_of_questions)
-    question = db.select_question_by_id(question_id)
-
-    return (
-        {
-            "id": question["id"],
-            "text": question["text"],
-            "answer": question["answer"],
-            "remarks": question["remarks"],
-        },
-        200,
-    )
+    return (question, 200)
 
 
 @app.route("/insert-into-answer-log", methods=["POST"])
@@ -94,6 +92,121 @@ def new_user_answer():
     return ("The answer log has been updated.", 201)
 
 
+def _parse_user_answer(user_answer):
+    """
+    Validates a user answer from the JSON body of a request to
+    /insert-into-answer-log/batch and converts it into a row of the
+    'answer_log' table.
+
+    Args:
+        user_answer: A dictionary containing the 'timestamp', 'user_id',
+                         'user_answer' and 'question_id' of a user answer.
+
+    Returns:
+        A (timestamp, user_id, user_answer, question_id) tuple.
+
+    Raises:
+        ValueError: If the user answer is missing a field, or if a field has
+                        an invalid value.
+    """
+
+    try:
+        timestamp = datetime.datetime.fromisoformat(user_answer["timestamp"])
+        user_id = int(user_answer["user_id"])
+        answer = user_answer["user_answer"]
+        question_id = int(user_answer["question_id"])
+    except KeyError as e:
+        raise ValueError(f"Missing field {e}") from e
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid field value: {e}") from e
+
+    # Naive timestamps would be read in the server's time zone rather than
+    # the bot's
+    if timestamp.tzinfo is None:
+        raise ValueError("The timestamp has no UTC offset")
+
+    if answer not in ("TRUE", "FALSE"):
+        raise ValueError(f"Invalid user_answer {answer!r}")
+
+    return (timestamp, user_id, answer, question_id)
+
+
+@app.route("/insert-into-answer-log/batch", methods=["POST"])
+def new_user_answers():
+    """
+    Adds a batch of users' quiz answers to the 'answer_log' table in the
+    database in a single transaction.
+
+    Each answer is validated before any are added. Valid answers are added
+    even if some of the other answers in the batch are rejected, in which case
+    the rejected answers are returned with a 207 status code.
+
+    This function is called when a POST request to
+    /insert-into-answer-log/batch is made.
+
+    URL Parameters:
+        None
+    JSON Body:
+        A list of dictionaries, with each dictionary containing:
+            timestamp: The time at which the user answered the quiz, in ISO
+                           8601 format with a UTC offset.
+            user_id: The Telegram user ID of the user that answered the quiz.
+            user_answer: The quiz option that the user chose, either "TRUE"
+                             or "FALSE".
+            question_id: The question ID of the quiz question that the user
+                             answered.
+    Returns:
+        A tuple containing either:
+            - "The answer log has been updated" as the response content, and
+            - the HTTP response status code 201,
+        or, if the valid answers have been added but some answers are
+        invalid:
+            - A dictionary containing the number of answers 'added' and the
+                  'rejected' answers, each with the 'user_answer' and the
+                  'error' explaining why it was rejected, as the response
+                  content, and
+            - the HTTP response status code 207,
+        or, if the body is not a list or all of the answers are invalid, and
+        no answers have been added:
+            - An error message or a dictionary of the same form as above, as
+                  the response content, and
+            - the HTTP response status code 400,
+        or, if the database is busy and no answers have been added:
+            - An error message as the response content, and
+            - the HTTP response status code 503.
+    """
+
+    user_answers = request.get_json()
+
+    if not isinstance(user_answers, list):
+        return ("The request body must be a list of user answers.", 400)
+
+    rows = []
+    rejected_user_answers = []
+
+    for user_answer in user_answers:
+        try:
+            rows.append(_parse_user_answer(user_answer))
+        except ValueError as e:
+            rejected_user_answers.append({"user_answer": user_answer, "error": str(e)})
+
+    if rejected_user_answers and not rows:
+        return ({"added": 0, "rejected": rejected_user_answers}, 400)
+
+    if rows:
+        try:
+            db.insert_many_answer_logs(rows)
+        except sqlite3.OperationalError:
+            # The transaction has been rolled back, so the batch can be retried
+            logging.exception("Error adding %d user answers", len(rows))
+            return ("The database is busy. No answers have been added.", 503)
+
+    if rejected_user_answers:
+        return ({"added": len(rows), "rejected": rejected_user_answers}, 207)
+
+    return ("The answer log has been updated.", 201)
+
+
 @app.route("/get-user-stats", methods=["GET"])
 def get_user_stats():
     """
@@ -102,6 +215,8 @@ def get_user_stats():
 
     This function is called when a GET request to /get-user-stats is made.
 
+    The statistics are cached for USER_STATS_CACHE_TTL seconds.
+
     URL Parameters:
         None
 
@@ -113,43 +228,11 @@ def get_user_stats():
             - the HTTP response status code 200.
     """
 
-    questions = db.get_questions()
-    answers = {}
-    for question in questions:
-        answers[question["id"]] = question["answer"]
-
-    answer_log = db.get_answer_log()
-    user_stats = {}
-    for answer_event in answer_log:
-        user_id = answer_event["user_id"]
-        user_answer = answer_event["user_answer"]
-        question_id = answer_event["question_id"]
-
-        if user_id not in user_stats:
-            user_stats[user_id] = {
-                "user_id": user_id,
-                "correctly_answered": 0,
-                "wrongly_answered": 0,
-                "total_answered": 0,
-            }
-
-        user_stats[user_id]["total_answered"] += 1
-
-        correct_answer = answers[question_id]
-        if user_answer == correct_answer:
-            user_stats[user_id]["correctly_answered"] += 1
-        else:
-            user_stats[user_id]["wrongly_answered"] += 1
-
-    for user_id, stats in user_stats.items():
-        try:
-            stats["percentage_correct"] = (
-                stats["correctly_answered"] / stats["total_answered"] * 100
-            )
-        except ZeroDivisionError:
-            stats["percentage_correct"] = 0
+    with _user_stats_cache_lock:
+        if time.monotonic() >= _user_stats_cache["expires_at"]:
+            _user_stats_cache["value"] = db.get_user_stats_aggregated()
+            _user_stats_cache["expires_at"] = time.monotonic() + USER_STATS_CACHE_TTL
 
-    user_stats_values = list(user_stats.values())
-    user_stats_values.sort(key=lambda x: x["percentage_correct"], reverse=True)
+        user_stats = _user_stats_cache["value"]
 
-    return (user_stats_values, 200)
+    return (user_stats, 200)
@@ -4,24 +4,72 @@ on a SQLite database.
 
 Functions:
     connect_to_db()
+    connect_to_db_for_reading()
+    init_pragmas(conn)
+    transaction()
     create_tables()
     insert_into_question(text, answer, remarks)
+    insert_many_questions(rows)
     select_question_by_text(text)
     select_question_by_id(question_id)
+    get_random_question()
+    iter_questions(batch_size)
     get_questions()
     insert_into_answer_log(timestamp, user_id, user_answer, question_id)
+    insert_many_answer_logs(rows)
+    iter_answer_log(batch_size)
     get_answer_log()
+    get_user_stats_aggregated()
 """
 
+import atexit
+from contextlib import contextmanager
+import datetime
 import os
 import sqlite3
+import threading
 
 DATABASE_PATH = os.environ["DATABASE_PATH"]
 
+# The number of rows fetched from the database at a time when iterating over
+# all records in a table
+FETCH_BATCH_SIZE = 1000
+
+# The version of the schema created by create_tables(), which is stored in the
+# database's user_version so that each migration only runs once. Version 1
+# stores answer timestamps as Unix timestamps instead of text
+SCHEMA_VERSION = 1
+
+# A single connection to the database is shared by all threads for writes
+# instead of opening a new connection for every query (or every thread, as the
+# Flask development server runs each client connection on a new thread)
+_conn = None  # pylint: disable=invalid-name
+
+# Guards the creation of the shared connection and serialises writes to the
+# database so that transactions from different threads do not interleave
+_lock = threading.RLock()
+
+# Each thread reads through its own connection, which is kept for as long as
+# the thread runs (i.e. for every request made over the same client
+# connection). Reads then only see committed data and, with write-ahead
+# logging, run concurrently with each other and with writes. SQLite's
+# shared-cache mode is not used to share a page cache between these
+# connections, as it locks whole tables and would make readers wait for the
+# writer again
+_read_local = threading.local()
+
+# Converts the Unix timestamps in the 'answer_log' table back to datetime
+# objects in the server's local time when a query on a read connection selects
+# them with the "timestamp [unix_timestamp]" column name
+sqlite3.register_converter(
+    "unix_timestamp", lambda value: datetime.datetime.fromtimestamp(int(value))
+)
+
 
 def connect_to_db():
     """
-    Creates a connection the database and returns that connection.
+    Returns the shared connection used to write to the database, creating the
+    connection if it does not exist yet.
 
     Args:
         None
@@ -30,14 +78,120 @@ def connect_to_db():
         A sqlite3 Connection object that connects to the database.
     """
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    global _conn  # pylint: disable=global-statement
+
+    with _lock:
+        if _conn is None:
+            # Statements are prepared once and then reused from the
+            # connection's statement cache (keyed by the SQL string), which
+            # holds far more statements than this module uses.
+            # Transactions are managed explicitly by transaction(), so the
+            # sqlite3 module is not allowed to open them implicitly.
+            # No row factory is set on the connection, so only the queries
+            # that access columns by name set sqlite3.Row on their cursor.
+            conn = sqlite3.connect(
+                DATABASE_PATH, check_same_thread=False, isolation_level=None
+            )
+            init_pragmas(conn)
+            atexit.register(conn.close)
+            _conn = conn
+        return _conn
+
+
+def connect_to_db_for_reading():
+    """
+    Returns the current thread's connection used to read from the database,
+    creating the connection if the thread does not have one yet.
+
+    Args:
+        None
+
+    Returns:
+        A read-only sqlite3 Connection object that connects to the database,
+        which must only be used by the current thread.
+    """
+
+    conn = getattr(_read_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(
+            DATABASE_PATH,
+            detect_types=sqlite3.PARSE_COLNAMES,
+            isolation_level=None,
+        )
+        init_pragmas(conn)
+        conn.execute("PRAGMA query_only = ON")
+        _read_local.conn = conn
     return conn
 
 
+def init_pragmas(conn):
+    """
+    Configures a connection to the database for better performance.
+
+    The following settings are applied:
+        - Write-ahead logging, so that readers do not block the writer and the
+              writer does not block readers.
+        - Syncing to disk only at WAL checkpoints instead of after every
+              transaction.
+        - Temporary tables and indices are kept in memory.
+        - A page cache of up to 64 MB.
+        - Memory-mapped I/O for up to the first 256 MB of the database file.
+
+    Args:
+        conn: The sqlite3 Connection object that will be configured.
+
+    Returns:
+        None
+    """
+
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -64000")
+    conn.execute("PRAGMA mmap_size = 268435456")
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the statements executed inside the 'with' block in a single
+    transaction, which is committed when the block exits normally and rolled
+    back if it raises an exception.
+
+    Writes from other threads are blocked until the transaction ends.
+
+    Args:
+        None
+
+    Returns:
+        A context manager that yields the sqlite3 Connection object on which
+        the statements should be executed.
+
+    Usage Example:
+        >>> with transaction() as conn:
+        ...     conn.executemany("INSERT INTO ...", rows)
+    """
+
+    conn = connect_to_db()
+    with _lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
 def create_tables():
     """
-    Creates the 'questions' and 'answer_log' tables if they don't exist.
+    Creates the 'questions' and 'answer_log' tables, the unique index on the
+    question text, and the indexes on the 'answer_log' table used to look up
+    user answers by question and by user, if they don't exist.
+
+    Databases created by earlier versions of this module are migrated to
+    SCHEMA_VERSION, e.g. answer timestamps stored as text are converted to
+    Unix timestamps.
 
     Args:
         None
@@ -47,36 +201,69 @@ def create_tables():
     """
 
     conn = connect_to_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-            CREATE TABLE IF NOT EXISTS questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-                text TEXT NOT NULL,
-                answer TEXT NOT NULL,
-                remarks TEXT
-            )
-        """
-    )
-    cur.execute(
-        """
-            CREATE TABLE IF NOT EXISTS answer_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-                timestamp DATE NOT NULL,
-                user_id INTEGER NOT NULL,
-                user_answer INTEGER NOT NULL,
-                question_id INTEGER NOT NULL,
-                FOREIGN KEY(question_id) REFERENCES questions(id)
+    with _lock:
+        # The whole schema is compiled and run in a single call. executescript()
+        # commits any open transaction before it runs, so the script opens its
+        # own transaction instead of using transaction(), and the transaction
+        # is committed once the database has been migrated
+        try:
+            conn.executescript(
+                """
+                    BEGIN IMMEDIATE;
+
+                    CREATE TABLE IF NOT EXISTS questions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+                        text TEXT NOT NULL,
+                        answer TEXT NOT NULL,
+                        remarks TEXT
+                    );
+
+                    CREATE TABLE IF NOT EXISTS answer_log (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+                        timestamp INTEGER NOT NULL,
+                        user_id INTEGER NOT NULL,
+                        user_answer INTEGER NOT NULL,
+                        question_id INTEGER NOT NULL,
+                        FOREIGN KEY(question_id) REFERENCES questions(id)
+                    );
+
+                    CREATE UNIQUE INDEX IF NOT EXISTS questions_text_idx
+                    ON questions(text);
+
+                    -- SQLite does not index foreign keys automatically
+                    CREATE INDEX IF NOT EXISTS answer_log_question_id_idx
+                    ON answer_log(question_id);
+
+                    CREATE INDEX IF NOT EXISTS answer_log_user_id_timestamp_idx
+                    ON answer_log(user_id, timestamp);
+                """
             )
-        """
-    )
-    conn.commit()
-    conn.close()
+
+            (schema_version,) = conn.execute("PRAGMA user_version").fetchone()
+            if schema_version < 1:
+                # Timestamps used to be stored as text in local time, which
+                # takes up about three times as much space as an integer
+                conn.execute(
+                    """
+                        UPDATE answer_log
+                        SET timestamp = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+                        WHERE typeof(timestamp) = 'text'
+                    """
+                )
+            if schema_version < SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
 
 
 def insert_into_question(text, answer, remarks):
     """
-    Inserts a record into the 'questions' table.
+    Inserts a record into the 'questions' table, unless a question with the
+    same text already exists.
 
     Args:
         text: A string of the question text.
@@ -87,17 +274,33 @@ def insert_into_question(text, answer, remarks):
         None
     """
 
-    conn = connect_to_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-            INSERT INTO questions(text, answer, remarks)
-            VALUES (?, ?, ?)
-        """,
-        (text, answer, remarks),
-    )
-    conn.commit()
-    conn.close()
+    insert_many_questions([(text, answer, remarks)])
+
+
+def insert_many_questions(rows):
+    """
+    Inserts multiple records into the 'questions' table in a single
+    transaction.
+
+    Questions with the same text as an existing question are not inserted.
+
+    Args:
+        rows: An iterable of (text, answer, remarks) tuples, with each tuple
+                  representing a question.
+
+    Returns:
+        An integer of the number of questions that were inserted.
+    """
+
+    with transaction() as conn:
+        cur = conn.executemany(
+            """
+                INSERT OR IGNORE INTO questions(text, answer, remarks)
+                VALUES (?, ?, ?)
+            """,
+            rows,
+        )
+    return cur.rowcount
 
 
 def select_question_by_text(text):
@@ -114,8 +317,9 @@ def select_question_by_text(text):
         'text'.
     """
 
-    conn = connect_to_db()
+    conn = connect_to_db_for_reading()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
     cur.execute(
         """
             SELECT *
@@ -125,7 +329,6 @@ def select_question_by_text(text):
         (text,),
     )
     row = cur.fetchone()
-    conn.close()
     return row
 
 
@@ -142,8 +345,9 @@ def select_question_by_id(question_id):
         A sqlite3 Row object that contains the question with the specified 'id'.
     """
 
-    conn = connect_to_db()
+    conn = connect_to_db_for_reading()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
     cur.execute(
         """
             SELECT *
@@ -153,32 +357,77 @@ def select_question_by_id(question_id):
         (question_id,),
     )
     row = cur.fetchone()
-    conn.close()
     return row
 
 
-def get_questions():
+def get_random_question():
     """
-    Selects and returns all records in the 'questions' table.
+    Selects and returns a random record from the 'questions' table.
 
     Args:
         None
 
     Returns:
-        A list of sqlite3 Row objects, with each Row object representing a
-        question.
+        A dictionary containing the 'id', 'text', 'answer' and 'remarks' of the
+        selected question, or None if there are no questions in the database.
     """
 
-    conn = connect_to_db()
+    conn = connect_to_db_for_reading()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    cur.execute(
+        """
+            SELECT id, text, answer, remarks
+            FROM questions
+            ORDER BY RANDOM()
+            LIMIT 1
+        """
+    )
+    row = cur.fetchone()
+    return dict(row) if row is not None else None
+
+
+def iter_questions(batch_size=FETCH_BATCH_SIZE):
+    """
+    Selects and yields all records in the 'questions' table, fetching
+    'batch_size' rows from the database at a time so that the whole table is
+    never held in memory at once.
+
+    Args:
+        batch_size: An integer of the number of rows fetched at a time.
+
+    Returns:
+        A generator of sqlite3 Row objects, with each Row object representing
+        a question.
+    """
+
+    conn = connect_to_db_for_reading()
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    cur.arraysize = batch_size
     cur.execute(
         """
             SELECT *
             FROM questions
         """,
     )
-    rows = cur.fetchall()
-    return rows
+    while rows := cur.fetchmany():
+        yield from rows
+
+
+def get_questions():
+    """
+    Selects and returns all records in the 'questions' table.
+
+    Args:
+        None
+
+    Returns:
+        A list of sqlite3 Row objects, with each Row object representing a
+        question.
+    """
+
+    return list(iter_questions())
 
 
 def insert_into_answer_log(timestamp, user_id, user_answer, question_id):
@@ -186,15 +435,12 @@ def insert_into_answer_log(timestamp, user_id, user_answer, question_id):
     Inserts a record into the 'answer_log' table.
 
     Args:
-        text: A string of the question text.
-        answer: A string of the correct answer to the question.
-        remarks: A string of the question remarks.
-
-        timestamp: A date object that represents the time at which the user
-                       answered the quiz.
+        timestamp: A datetime object that represents the time at which the
+                       user answered the quiz.
         user_id: A string of the Telegram user ID of the user who answered the
                      quiz.
-        user_answer: A string of the quiz option that the user chose.
+        user_answer: A string of the quiz option that the user chose, which
+                         is compared with the 'answer' of the question.
         question_id: The question ID of the quiz question that the user
                          answered.
 
@@ -202,17 +448,72 @@ def insert_into_answer_log(timestamp, user_id, user_answer, question_id):
         None
     """
 
-    conn = connect_to_db()
+    insert_many_answer_logs([(timestamp, user_id, user_answer, question_id)])
+
+
+def insert_many_answer_logs(rows):
+    """
+    Inserts multiple records into the 'answer_log' table in a single
+    transaction.
+
+    The timestamps are stored as Unix timestamps (whole seconds since the
+    epoch).
+
+    Args:
+        rows: An iterable of (timestamp, user_id, user_answer, question_id)
+                  tuples, with each tuple representing a user answer and
+                  each timestamp being a datetime object.
+
+    Returns:
+        None
+    """
+
+    with transaction() as conn:
+        conn.executemany(
+            """
+                INSERT INTO answer_log(timestamp, user_id, user_answer, question_id)
+                VALUES (?, ?, ?, ?)
+            """,
+            (
+                (int(timestamp.timestamp()), user_id, user_answer, question_id)
+                for timestamp, user_id, user_answer, question_id in rows
+            ),
+        )
+
+
+def iter_answer_log(batch_size=FETCH_BATCH_SIZE):
+    """
+    Selects and yields all records in the 'answer_log' table, fetching
+    'batch_size' rows from the database at a time so that the whole table is
+    never held in memory at once.
+
+    Args:
+        batch_size: An integer of the number of rows fetched at a time.
+
+    Returns:
+        A generator of sqlite3 Row objects, with each Row object representing
+        a user answer. The 'timestamp' of each user answer is converted from
+        the stored Unix timestamp to a naive datetime object in the server's
+        local time.
+    """
+
+    conn = connect_to_db_for_reading()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    cur.arraysize = batch_size
     cur.execute(
         """
-            INSERT INTO answer_log(timestamp, user_id, user_answer, question_id)
-            VALUES (?, ?, ?, ?)
-        """,
-        (timestamp, user_id, user_answer, question_id),
+            SELECT
+                id,
+                timestamp AS "timestamp [unix_timestamp]",
+                user_id,
+                user_answer,
+                question_id
+            FROM answer_log
+        """
     )
-    conn.commit()
-    conn.close()
+    while rows := cur.fetchmany():
+        yield from rows
 
 
 def get_answer_log():
@@ -224,16 +525,52 @@ def get_answer_log():
 
     Returns:
         A list of sqlite3 Row objects, with each Row object representing a
-        user answer.
+        user answer. The 'timestamp' of each user answer is converted from the
+        stored Unix timestamp to a naive datetime object in the server's local
+        time.
     """
 
-    conn = connect_to_db()
+    return list(iter_answer_log())
+
+
+def get_user_stats_aggregated():
+    """
+    Computes and returns answer statistics for every user in the 'answer_log'
+    table.
+
+    Args:
+        None
+
+    Returns:
+        A list of dictionaries, with each dictionary containing the 'user_id',
+        'correctly_answered', 'wrongly_answered', 'total_answered' and
+        'percentage_correct' of a user, sorted in descending order based on
+        'percentage_correct'. Users with the same 'percentage_correct' are
+        sorted by 'total_answered' in descending order, then by 'user_id'.
+    """
+
+    conn = connect_to_db_for_reading()
     cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
     cur.execute(
         """
-            SELECT *
-            FROM answer_log
+            SELECT
+                user_id,
+                correctly_answered,
+                total_answered - correctly_answered AS wrongly_answered,
+                total_answered,
+                correctly_answered * 100.0 / total_answered AS percentage_correct
+            FROM (
+                SELECT
+                    al.user_id,
+                    SUM(al.user_answer = q.answer) AS correctly_answered,
+                    COUNT(*) AS total_answered
+                FROM answer_log al
+                JOIN questions q ON q.id = al.question_id
+                GROUP BY al.user_id
+            )
+            ORDER BY percentage_correct DESC, total_answered DESC, user_id
         """
     )
-    rows = cur.fetchall()
-    return rows
+    user_stats = [dict(row) for row in cur]
+    return user_stats
@@ -2,19 +2,37 @@
 This module contains functions used to scrape the HTML of the WFDF Advanced
 Accreditation Quiz results age.
 
-The generate_csv_from_html function is the main function, while the remaining
-functions serve as helper functions.
+The scrape_questions and generate_csv_from_html functions are the main
+functions, while the remaining functions serve as helper functions.
 
 Functions:
     get_question_text(show_question_content_html_class)
     get_correct_answer(show_question_choices_html_class)
     get_remarks(watupro_main_feedback_html_class)
+    get_question_parts(watupro_choices_columns_html_class)
+    scrape_questions(raw_html)
     generate_csv_from_html(raw_html, csv_file_path)
 """
 
-import re
 import csv
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+
+# The classes of the elements of a question that contain its text, choices
+# and remarks
+QUESTION_PART_CLASSES = (
+    "show-question-content",
+    "show-question-choices",
+    "watupro-main-feedback",
+)
+
+# Matches all the elements of a question with a class in QUESTION_PART_CLASSES
+QUESTION_PARTS_SELECTOR = ", ".join(
+    f".{html_class}" for html_class in QUESTION_PART_CLASSES
+)
+
+# Maps the correct answer shown on the results page to the answer stored in
+# the database
+CORRECT_ANSWERS = {"True": "TRUE", "False": "FALSE"}
 
 
 def get_question_text(show_question_content_html_class):
@@ -23,8 +41,9 @@ def get_question_text(show_question_content_html_class):
     question text from that question.
 
     Args:
-        show_question_content_html_class: A BS4 Tag object representing the
-                                              HTML element with the
+        show_question_content_html_class: A selectolax Node object
+                                              representing the HTML element
+                                              with the
                                               class="show-question-content".
 
     Returns:
@@ -32,15 +51,15 @@ def get_question_text(show_question_content_html_class):
     """
 
     question_text = ""
-    tags = show_question_content_html_class.find_all(class_="p1")
+    tags = show_question_content_html_class.css(".p1")
 
     for tag in tags:
-        formatted_text = re.sub(r"\s+", " ", tag.text.strip())
+        formatted_text = " ".join(tag.text().split())
 
-        if tag.name == "li":
+        if tag.tag == "li":
             bullet_point = "\u2022"
             question_text += f"{bullet_point} {formatted_text}"
-        elif tag.name == "p":
+        elif tag.tag == "p":
             question_text += formatted_text
         else:
             raise TypeError
@@ -56,21 +75,23 @@ def get_correct_answer(show_question_choices_html_class):
     correct answer from that question.
 
     Args:
-        show_question_choices_html_class: A BS4 Tag object representing the HTML
-                                              element with the
+        show_question_choices_html_class: A selectolax Node object
+                                              representing the HTML element
+                                              with the
                                               class="show-question-choices".
     Returns:
         A string, either "TRUE" or "FALSE", of the correct answer of the
         specified question.
+
+    Raises:
+        KeyError: If the correct answer is neither "True" nor "False".
     """
 
-    answer = (
-        show_question_choices_html_class.find(class_="correct-answer")
-        .find(class_="answer")
-        .text
-    )
+    answer = show_question_choices_html_class.css_first(
+        ".correct-answer .answer"
+    ).text()
 
-    return "TRUE" if answer == "True" else "FALSE"
+    return CORRECT_ANSWERS[answer.strip()]
 
 
 def get_remarks(watupro_main_feedback_html_class):
@@ -79,61 +100,101 @@ def get_remarks(watupro_main_feedback_html_class):
     remarks from that question.
 
     Args:
-        watupro_main_feedback_html_class: A BS4 Tag object representing the HTML
-                                              element with the
+        watupro_main_feedback_html_class: A selectolax Node object
+                                              representing the HTML element
+                                              with the
                                               class="watupro-main-feedback".
 
     Returns:
         A string of the remarks from the specified question.
     """
 
-    remarks = watupro_main_feedback_html_class.find(class_="p1").text
-    formatted_remarks = re.sub(r"\s+", " ", remarks.strip())
+    remarks = watupro_main_feedback_html_class.css_first(".p1").text()
+    formatted_remarks = " ".join(remarks.split())
 
     return formatted_remarks
 
 
-def generate_csv_from_html(raw_html, csv_file_path):
+def get_question_parts(watupro_choices_columns_html_class):
+    """
+    Finds the elements of a question that contain its text, choices and
+    remarks, using a single query over the question element.
+
+    Args:
+        watupro_choices_columns_html_class: A selectolax Node object
+                                                representing the HTML element
+                                                with the
+                                                class="watupro-choices-columns".
+
+    Returns:
+        A tuple of selectolax Node objects representing the first HTML element
+        with each class in QUESTION_PART_CLASSES, in the same order.
+
+    Raises:
+        ValueError: If the question has no HTML element with one of the
+                        classes in QUESTION_PART_CLASSES.
+    """
+
+    parts = {}
+
+    for node in watupro_choices_columns_html_class.css(QUESTION_PARTS_SELECTOR):
+        for html_class in (node.attributes.get("class") or "").split():
+            if html_class in QUESTION_PART_CLASSES:
+                parts.setdefault(html_class, node)
+
+    for html_class in QUESTION_PART_CLASSES:
+        if html_class not in parts:
+            raise ValueError(f'Question has no element with class="{html_class}"')
+
+    return tuple(parts[html_class] for html_class in QUESTION_PART_CLASSES)
+
+
+def scrape_questions(raw_html):
     """
     Scrapes the HTML of the WFDF Advanced Accreditation Quiz results page and
-    generates a CSV file containing the quiz questions.
+    yields the quiz questions as they are scraped.
 
     Args:
         raw_html: A string containing the HTML of the results page.
-        csv_file_path: The file path of the CSV file that will be generated.
 
     Returns:
-        None
+        A generator of (question_text, correct_answer, remarks) tuples, with
+        each tuple representing a question.
     """
 
-    soup = BeautifulSoup(raw_html, "lxml")
-    questions = soup.find_all(class_="watupro-choices-columns")
+    tree = LexborHTMLParser(raw_html)
+    questions = tree.css(".watupro-choices-columns")
 
-    data_to_write = []
     for question in questions:
-        question_text = get_question_text(question.find(class_="show-question-content"))
-        correct_answer = get_correct_answer(
-            question.find(class_="show-question-choices")
-        )
-        remarks = get_remarks(question.find(class_="watupro-main-feedback"))
-
-        data_to_write.append(
-            {
-                "question_text": question_text,
-                "correct_answer": correct_answer,
-                "remarks": remarks,
-            }
+        content, choices, feedback = get_question_parts(question)
+        yield (
+            get_question_text(content),
+            get_correct_answer(choices),
+            get_remarks(feedback),
         )
 
+
+def generate_csv_from_html(raw_html, csv_file_path):
+    """
+    Scrapes the HTML of the WFDF Advanced Accreditation Quiz results page and
+    generates a CSV file containing the quiz questions.
+
+    Args:
+        raw_html: A string containing the HTML of the results page.
+        csv_file_path: The file path of the CSV file that will be generated.
+
+    Returns:
+        None
+    """
+
     # Define the headers for the CSV file
     headers = ["question_text", "correct_answer", "remarks"]
 
     with open(csv_file_path, "w", newline="", encoding="utf-8") as csv_file:
-        csvwriter = csv.DictWriter(csv_file, fieldnames=headers)
+        csvwriter = csv.writer(csv_file)
 
         # Write headers to the CSV file
-        csvwriter.writeheader()
+        csvwriter.writerow(headers)
 
-        # Write each dictionary as a row in the CSV file
-        for item in data_to_write:
-            csvwriter.writerow(item)
+        # Write each question as a row in the CSV file as soon as it is scraped
+        csvwriter.writerows(scrape_questions(raw_html))